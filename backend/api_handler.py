@@ -1,20 +1,34 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 
+import torch
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 from .config import (
     API_HOST,
+    API_HTTP,
+    API_LIMIT_CONCURRENCY,
     API_LOG_LEVEL,
+    API_LOOP,
     API_PORT,
     API_RELOAD,
+    API_TIMEOUT_KEEP_ALIVE,
+    API_WORKERS,
     CORS_CREDENTIALS,
     CORS_HEADERS,
     CORS_METHODS,
     CORS_ORIGINS,
     LOG_LEVEL,
+    NAME_MATCHER_MAX_BATCH,
+    TORCH_NUM_INTEROP_THREADS,
+    TORCH_NUM_THREADS,
 )
 from .services.name_matching import NameMatcher
 from .services.recipe_bot import RecipeBot
@@ -23,7 +37,36 @@ logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
-app = FastAPI(title="Name Matching & Recipe Chatbot API")
+name_matcher = None
+recipe_bot = None
+
+# Single thread so concurrent generations don't contend for torch's BLAS threads
+recipe_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recipe-bot")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models are built at worker startup, so every uvicorn worker owns its own copy
+    global name_matcher, recipe_bot
+    torch.set_num_threads(TORCH_NUM_THREADS)
+    torch.set_num_interop_threads(TORCH_NUM_INTEROP_THREADS)
+    torch.backends.mkldnn.enabled = True
+
+    name_matcher = NameMatcher()
+    recipe_bot = RecipeBot()
+
+    # Run dummy inputs through both models so the first real request is steady-state
+    name_matcher.find_similar_names("warmup")
+    recipe_bot.warmup()
+    yield
+    recipe_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(
+    title="Name Matching & Recipe Chatbot API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,16 +76,18 @@ app.add_middleware(
     allow_headers=CORS_HEADERS,
 )
 
-name_matcher = NameMatcher()
-recipe_bot = RecipeBot()
-
 
 class NameRequest(BaseModel):
     name: str
 
 
+class NameBatchRequest(BaseModel):
+    names: list[str] = Field(min_length=1, max_length=NAME_MATCHER_MAX_BATCH)
+
+
 class RecipeRequest(BaseModel):
     ingredients: str
+    deterministic: bool = False
 
 
 class NameMatch(BaseModel):
@@ -56,6 +101,10 @@ class NameMatchResponse(BaseModel):
     all_matches: list[NameMatch]
 
 
+class NameMatchBatchResponse(BaseModel):
+    results: list[NameMatchResponse]
+
+
 class RecipeResponse(BaseModel):
     recipe: str
     generated_by: str
@@ -68,7 +117,9 @@ async def root():
         "endpoints": {
             "health": "/health",
             "match_names": "/api/match-names",
+            "match_names_batch": "/api/match-names-batch",
             "get_recipe": "/api/get-recipe",
+            "stream_recipe": "/api/stream-recipe",
         },
     }
 
@@ -78,35 +129,70 @@ async def health_check():
     return {"status": "healthy", "service": "api"}
 
 
+def _name_match_response(input_name, results):
+    return NameMatchResponse(
+        input_name=input_name,
+        best_match=NameMatch(
+            name=results["best_match"]["name"], score=results["best_match"]["score"]
+        ),
+        all_matches=[
+            NameMatch(name=match["name"], score=match["score"])
+            for match in results["all_matches"]
+        ],
+    )
+
+
 @app.post("/api/match-names", response_model=NameMatchResponse)
 async def match_names(request: NameRequest):
     try:
         if not request.name or not request.name.strip():
             raise HTTPException(status_code=400, detail="Name cannot be empty")
 
-        results = name_matcher.find_similar_names(request.name.strip())
-
-        return NameMatchResponse(
-            input_name=request.name,
-            best_match=NameMatch(
-                name=results["best_match"]["name"], score=results["best_match"]["score"]
-            ),
-            all_matches=[
-                NameMatch(name=match["name"], score=match["score"])
-                for match in results["all_matches"]
-            ],
+        results = await asyncio.to_thread(
+            name_matcher.find_similar_names, request.name.strip()
         )
+
+        return _name_match_response(request.name, results)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/match-names-batch", response_model=NameMatchBatchResponse)
+async def match_names_batch(request: NameBatchRequest):
+    if any(not name.strip() for name in request.names):
+        raise HTTPException(status_code=400, detail="Names cannot be empty")
+
+    try:
+        # One fuzzy pass and one encoder batch for every name in the request
+        results = await asyncio.to_thread(
+            name_matcher.find_similar_names_batch,
+            [name.strip() for name in request.names],
+        )
+
+        return NameMatchBatchResponse(
+            results=[
+                _name_match_response(name, result)
+                for name, result in zip(request.names, results, strict=True)
+            ]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
 @app.post("/api/get-recipe", response_model=RecipeResponse)
 async def get_recipe(request: RecipeRequest):
     try:
         if not request.ingredients or not request.ingredients.strip():
             raise HTTPException(status_code=400, detail="Ingredients cannot be empty")
 
-        result = recipe_bot.generate_recipe(request.ingredients.strip())
+        result = await asyncio.get_running_loop().run_in_executor(
+            recipe_executor,
+            partial(
+                recipe_bot.generate_recipe,
+                request.ingredients.strip(),
+                deterministic=request.deterministic,
+            ),
+        )
 
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result["error"])
@@ -117,16 +203,50 @@ async def get_recipe(request: RecipeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse_frame(data, event=None):
+    # An SSE data field can't contain newlines, so split them across fields
+    frame = "".join(f"data: {line}\n" for line in data.split("\n"))
+    if event is not None:
+        frame = f"event: {event}\n{frame}"
+    return frame + "\n"
+
+
+def _sse_events(chunks):
+    try:
+        for chunk in chunks:
+            yield _sse_frame(chunk)
+    except Exception as e:
+        yield _sse_frame(str(e), event="error")
+        return
+    # Lets the client tell a complete recipe from a dropped or failed stream
+    yield _sse_frame("", event="done")
+
+
+@app.post("/api/stream-recipe")
+async def stream_recipe(request: RecipeRequest):
+    if not request.ingredients or not request.ingredients.strip():
+        raise HTTPException(status_code=400, detail="Ingredients cannot be empty")
+
+    chunks = recipe_bot.stream_recipe(
+        request.ingredients.strip(), deterministic=request.deterministic
+    )
+    return StreamingResponse(_sse_events(chunks), media_type="text/event-stream")
+
+
 if __name__ == "__main__":
     logger.info("Starting Name Matching & Recipe Chatbot API Server")
     logger.info(f"API will be available at: http://{API_HOST}:{API_PORT}")
     logger.info(f"API Documentation: http://{API_HOST}:{API_PORT}/docs")
 
     uvicorn.run(
-        app,
+        "backend.api_handler:app",
         host=API_HOST,
         port=API_PORT,
-        timeout_keep_alive=300,
+        workers=API_WORKERS,
+        loop=API_LOOP,
+        http=API_HTTP,
+        limit_concurrency=API_LIMIT_CONCURRENCY,
+        timeout_keep_alive=API_TIMEOUT_KEEP_ALIVE,
         log_level=API_LOG_LEVEL,
         reload=API_RELOAD,
     )
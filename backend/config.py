@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent.absolute()
@@ -8,6 +9,10 @@ RECIPE_BOT_MODEL_PATH = str(PROJECT_DIR / "models" / "recipe-bot-finetuned-v1")
 RECIPE_BOT_BASE_MODEL = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 
 NAME_MATCHER_MODEL = "sentence-transformers/paraphrase-MiniLM-L3-v2"
+# Dynamic-quantized INT8 ONNX export of NAME_MATCHER_MODEL, used when present
+NAME_MATCHER_ONNX_DIR = PROJECT_DIR / "models" / "minilm-int8"
+NAME_MATCHER_ONNX_FILE = "model_int8.onnx"
+NAME_MATCHER_MAX_SEQ_LENGTH = 128
 
 DATA_DIR = PROJECT_DIR / "data"
 NAMES_DATA_PATH = DATA_DIR / "names.json"
@@ -16,24 +21,50 @@ RECIPES_TRAINING_DATA_PATH = DATA_DIR / "recipes_training_final.json"
 
 DEVICE = "cpu"
 
+# Each worker process loads its own copy of both models
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+# Split the cores between uvicorn workers so torch doesn't oversubscribe them
+TORCH_NUM_THREADS = max(1, (os.cpu_count() or 1) // API_WORKERS)
+TORCH_NUM_INTEROP_THREADS = 1
+
 RECIPE_MAX_NEW_TOKENS = 150
 RECIPE_MIN_NEW_TOKENS = 50
 RECIPE_TEMPERATURE = 0.7
 RECIPE_TOP_P = 0.9
 RECIPE_TOP_K = 50
 RECIPE_REPETITION_PENALTY = 1.2
+RECIPE_CACHE_SIZE = 256  # Cached greedy (deterministic) generations
+
+# bitsandbytes INT8 weights; only applied when CUDA and bitsandbytes are available
+RECIPE_BOT_LOAD_IN_8BIT = True
+RECIPE_BOT_INT8_THRESHOLD = 6.0
+
+# Graph-compile the decoder forward (and apply ipex.llm.optimize when installed)
+RECIPE_BOT_TORCH_COMPILE = True
+RECIPE_BOT_COMPILE_MODE = "reduce-overhead"
+RECIPE_BOT_WARMUP_TOKENS = 8
 
 NAME_MATCHER_DEVICE = "cpu"
 NAME_MATCHER_THRESHOLD = 0.6  # Minimum similarity score
+NAME_MATCHER_EMBEDDING_CACHE_SIZE = 2048  # Cached query embeddings (LRU)
+NAME_MATCHER_FUZZY_SHORTCUT = 0.95  # Fuzzy score that skips semantic encoding
+NAME_MATCHER_MAX_BATCH = 64  # Names accepted by one /api/match-names-batch call
 
 os.environ["HF_HUB_DOWNLOAD_TIMEOUT"] = "600"
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 os.environ["HF_HUB_DISABLE_PROGRESS_BARS"] = "1"
+os.environ.setdefault(
+    "TORCHINDUCTOR_CACHE_DIR", str(PROJECT_DIR / ".cache" / "torchinductor")
+)
 
 API_HOST = "0.0.0.0"
 API_PORT = 8000
 API_RELOAD = False
 API_LOG_LEVEL = "info"
+API_LOOP = "asyncio" if sys.platform == "win32" else "uvloop"  # no uvloop on Windows
+API_HTTP = "httptools"
+API_LIMIT_CONCURRENCY = 1000
+API_TIMEOUT_KEEP_ALIVE = 30
 
 CORS_ORIGINS = ["*"]
 CORS_CREDENTIALS = True
@@ -1,35 +1,120 @@
 import json
 import logging
 import os
+import threading
 
 import numpy as np
-from fuzzywuzzy import fuzz
-from sentence_transformers import SentenceTransformer, util
+from cachetools import LRUCache
+from rapidfuzz import fuzz, process
+from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
 
 from ..config import (
     LOG_LEVEL,
     NAME_MATCHER_DEVICE,
+    NAME_MATCHER_EMBEDDING_CACHE_SIZE,
+    NAME_MATCHER_FUZZY_SHORTCUT,
+    NAME_MATCHER_MAX_SEQ_LENGTH,
     NAME_MATCHER_MODEL,
+    NAME_MATCHER_ONNX_DIR,
+    NAME_MATCHER_ONNX_FILE,
     NAMES_DATA_PATH,
+    TORCH_NUM_THREADS,
 )
 
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
+def _quantize_int8(embeddings):
+    # Symmetric per-vector quantization: int8 values plus one float scale per row
+    scales = np.max(np.abs(embeddings), axis=-1, keepdims=True) / 127.0
+    scales = np.maximum(scales, np.finfo(np.float32).tiny)
+    quantized = np.round(embeddings / scales).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
 class NameMatcher:
     def __init__(self):
         self.names = self._load_names()
+        self.names_lower = [name.lower() for name in self.names]
+        self._embedding_cache = LRUCache(maxsize=NAME_MATCHER_EMBEDDING_CACHE_SIZE)
+        self._embedding_lock = threading.Lock()
 
         logger.info("Loading semantic similarity model...")
-        self.model = SentenceTransformer(NAME_MATCHER_MODEL, device=NAME_MATCHER_DEVICE)
+        self.model = None
+        self.session = None
+        onnx_path = NAME_MATCHER_ONNX_DIR / NAME_MATCHER_ONNX_FILE
+        if ort is not None and onnx_path.exists():
+            self._load_onnx_model(onnx_path)
+        else:
+            logger.info(
+                "INT8 ONNX encoder not found, using SentenceTransformer "
+                "(run training/helpers/export_name_matcher_onnx.py to create it)"
+            )
+            self.model = SentenceTransformer(
+                NAME_MATCHER_MODEL, device=NAME_MATCHER_DEVICE
+            )
 
         logger.info("Pre-computing name embeddings...")
-        self.name_embeddings = self.model.encode(
-            self.names, convert_to_tensor=True, show_progress_bar=False
-        )
+        name_embeddings = self._embed(self.names)
+        self.name_embeddings_i8, self.name_scales = _quantize_int8(name_embeddings)
+        self.name_scales = self.name_scales.squeeze(-1)
         logger.info(f"Loaded {len(self.names)} names with embeddings")
 
+    def _load_onnx_model(self, onnx_path):
+        logger.info(f"Loading INT8 ONNX encoder from {onnx_path}...")
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = TORCH_NUM_THREADS
+        sess_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = ort.InferenceSession(
+            str(onnx_path),
+            sess_options=sess_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.session_inputs = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(NAME_MATCHER_ONNX_DIR)
+
+    def _embed(self, texts):
+        if self.session is None:
+            return self.model.encode(
+                texts,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=NAME_MATCHER_MAX_SEQ_LENGTH,
+            return_tensors="np",
+        )
+        feed = {
+            k: v.astype(np.int64)
+            for k, v in encoded.items()
+            if k in self.session_inputs
+        }
+        token_embeddings = self.session.run(None, feed)[0]
+
+        # Mean pooling over real tokens, then L2-normalize (matches the ST pipeline)
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(
+            mask.sum(axis=1), 1e-9
+        )
+        embeddings /= np.maximum(
+            np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+        )
+        return embeddings.astype(np.float32)
+
     def _load_names(self):
         data_path = str(NAMES_DATA_PATH)
 
@@ -98,33 +183,87 @@ class NameMatcher:
             "Rama",
         ]
 
+    def _encode_batch(self, texts):
+        # Shares the per-text LRU; only misses go through the encoder, in one batch
+        keys = [text.lower() for text in texts]
+        with self._embedding_lock:
+            cached = {key: self._embedding_cache.get(key) for key in keys}
+
+        missing = {
+            key: text
+            for key, text in zip(keys, texts, strict=True)
+            if cached[key] is None
+        }
+        if missing:
+            embeddings = self._embed(list(missing.values()))
+            with self._embedding_lock:
+                for key, embedding in zip(missing, embeddings, strict=True):
+                    self._embedding_cache[key] = embedding
+                    cached[key] = embedding
+
+        return np.stack([cached[key] for key in keys])
+
     def find_similar_names(self, input_name, top_k=5):
-        input_embedding = self.model.encode(input_name, convert_to_tensor=True)
+        return self.find_similar_names_batch([input_name], top_k)[0]
 
-        semantic_scores = (
-            util.cos_sim(input_embedding, self.name_embeddings)[0].cpu().numpy()
+    def find_similar_names_batch(self, input_names, top_k=5):
+        fuzzy_scores = (
+            process.cdist(
+                [name.lower() for name in input_names],
+                self.names_lower,
+                scorer=fuzz.ratio,
+                dtype=np.float32,
+            )
+            / 100.0
         )
 
-        fuzzy_scores = np.array(
-            [
-                fuzz.ratio(input_name.lower(), name.lower()) / 100.0
-                for name in self.names
-            ]
+        # A (near-)exact spelling hit is unambiguous, so skip the transformer pass
+        semantic_scores = fuzzy_scores.copy()
+        needs_semantic = np.flatnonzero(
+            fuzzy_scores.max(axis=1) < NAME_MATCHER_FUZZY_SHORTCUT
         )
+        if needs_semantic.size:
+            input_embeddings = self._encode_batch(
+                [input_names[i] for i in needs_semantic]
+            )
+            input_i8, input_scales = _quantize_int8(input_embeddings)
+
+            # Embeddings are unit-normalized, so the rescaled int8 dot product is cos sim
+            dots = (
+                input_i8.astype(np.int32) @ self.name_embeddings_i8.astype(np.int32).T
+            )
+            semantic_scores[needs_semantic] = dots.astype(np.float32) * (
+                input_scales * self.name_scales
+            )
 
         combined_scores = (0.6 * semantic_scores) + (0.4 * fuzzy_scores)
 
-        sorted_indices = np.argsort(combined_scores)[::-1]
+        return [
+            self._rank(combined_scores[i], semantic_scores[i], fuzzy_scores[i], top_k)
+            for i in range(len(input_names))
+        ]
+
+    def _rank(self, combined_scores, semantic_scores, fuzzy_scores, top_k):
+        # Partial selection of the top k, then sort only those k
+        k = min(top_k, len(combined_scores))
+        top_indices = np.argpartition(-combined_scores, k - 1)[:k]
+        sorted_indices = top_indices[np.argsort(-combined_scores[top_indices])]
 
-        all_matches = []
-        for idx in sorted_indices[:top_k]:
-            match = {
+        # Round all score columns at once (in float64, so the rounded values are exact)
+        scores = np.stack([combined_scores, semantic_scores, fuzzy_scores])
+        scores = np.round(scores[:, sorted_indices].astype(np.float64), 3).tolist()
+
+        all_matches = [
+            {
                 "name": self.names[idx],
-                "score": round(float(combined_scores[idx]), 3),
-                "semantic_score": round(float(semantic_scores[idx]), 3),
-                "fuzzy_score": round(float(fuzzy_scores[idx]), 3),
+                "score": score,
+                "semantic_score": semantic_score,
+                "fuzzy_score": fuzzy_score,
             }
-            all_matches.append(match)
+            for idx, score, semantic_score, fuzzy_score in zip(
+                sorted_indices.tolist(), *scores, strict=True
+            )
+        ]
 
         best_match = {"name": all_matches[0]["name"], "score": all_matches[0]["score"]}
 
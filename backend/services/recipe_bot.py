@@ -1,13 +1,29 @@
+import importlib.util
 import logging
+import re
+import threading
+from collections.abc import Iterator
 
 import torch
+from cachetools import LRUCache
 from peft import PeftModel
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    BitsAndBytesConfig,
+    TextIteratorStreamer,
+)
 
 from ..config import (
     DEVICE,
     RECIPE_BOT_BASE_MODEL,
+    RECIPE_BOT_COMPILE_MODE,
+    RECIPE_BOT_INT8_THRESHOLD,
+    RECIPE_BOT_LOAD_IN_8BIT,
     RECIPE_BOT_MODEL_PATH,
+    RECIPE_BOT_TORCH_COMPILE,
+    RECIPE_BOT_WARMUP_TOKENS,
+    RECIPE_CACHE_SIZE,
     RECIPE_MAX_NEW_TOKENS,
     RECIPE_MIN_NEW_TOKENS,
     RECIPE_REPETITION_PENALTY,
@@ -19,6 +35,44 @@ from ..config import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_PROMPT_PREFIX = "<s>[INST] Suggest a recipe using the following ingredients:\n"
+_PROMPT_SUFFIX = " [/INST]"
+_PROMPT_MAX_LENGTH = 512
+
+_INGREDIENT_RE = re.compile(r"ingredient", re.IGNORECASE)
+_INSTRUCTION_RE = re.compile(r"instruction", re.IGNORECASE)
+_COOKING_WORD_RE = re.compile(
+    r"cook|heat|add|mix|stir|serve|bake|fry|boil", re.IGNORECASE
+)
+
+
+def _select_dtype() -> torch.dtype:
+    # BF16 halves weight traffic, but without a native BF16 path on the CPU
+    # (AVX512-BF16/AMX) it is emulated and slower than FP32
+    if (
+        torch.backends.mkldnn.is_available()
+        and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    ):
+        return torch.bfloat16
+    return torch.float32
+
+
+def _sampling_kwargs(deterministic: bool) -> dict:
+    if deterministic:
+        return {
+            "do_sample": False,
+            "num_beams": 1,
+            "temperature": None,
+            "top_p": None,
+            "top_k": None,
+        }
+    return {
+        "do_sample": True,
+        "temperature": RECIPE_TEMPERATURE,
+        "top_p": RECIPE_TOP_P,
+        "top_k": RECIPE_TOP_K,
+    }
+
 
 class RecipeBot:
     def __init__(self, model_path: str = None):
@@ -30,91 +84,182 @@ class RecipeBot:
         self.model = None
         self.tokenizer = None
         self.device = DEVICE
+        self.dtype = _select_dtype()
+        self._recipe_cache = LRUCache(maxsize=RECIPE_CACHE_SIZE)
+        # Streamed generations run on their own threads; keep one decode at a time
+        self._generate_lock = threading.Lock()
         self.load_model()
+        # Inference only: no parameter should ever record autograd history
+        self.model.requires_grad_(False)
+        self._optimize_model()
 
     def load_model(self):
         try:
             logger.info(f"Loading base model + LoRA adapter from {self.model_path}...")
 
             self.tokenizer = AutoTokenizer.from_pretrained(
-                self.base_model_name, trust_remote_code=True
+                self.base_model_name, use_fast=True, trust_remote_code=True
             )
             self.tokenizer.pad_token = self.tokenizer.eos_token
             self.tokenizer.padding_side = "right"
 
-            base_model = AutoModelForCausalLM.from_pretrained(
-                self.base_model_name,
-                torch_dtype=torch.float32,
-                device_map="cpu",
-                low_cpu_mem_usage=True,
-                trust_remote_code=True,
-            )
+            bnb_config = self._quantization_config()
+            if bnb_config is not None:
+                logger.info("Loading base model with INT8 weights (bitsandbytes)...")
+                base_model = AutoModelForCausalLM.from_pretrained(
+                    self.base_model_name,
+                    quantization_config=bnb_config,
+                    device_map="auto",
+                    low_cpu_mem_usage=True,
+                    trust_remote_code=True,
+                )
+            else:
+                base_model = AutoModelForCausalLM.from_pretrained(
+                    self.base_model_name,
+                    torch_dtype=self.dtype,
+                    device_map="cpu",
+                    low_cpu_mem_usage=True,
+                    trust_remote_code=True,
+                )
 
             self.model = PeftModel.from_pretrained(base_model, self.model_path)
 
+            if bnb_config is None:
+                # Fold the LoRA deltas into the base weights; we never train here
+                self.model = self.model.merge_and_unload()
+            else:
+                logger.info("INT8 base weights, keeping LoRA adapter unmerged")
+
             self.model.eval()
             self.model.config.use_cache = True
 
-            logger.info("LoRA model loaded successfully!")
+            logger.info(f"LoRA model loaded successfully! (dtype: {self.dtype})")
 
         except Exception as e:
             logger.error(f"Error loading LoRA model: {e}")
             logger.error("Falling back to base model...")
             self._load_base_model()
 
+    def _quantization_config(self):
+        # bitsandbytes INT8 kernels need CUDA; CPU deployments keep full weights
+        if not RECIPE_BOT_LOAD_IN_8BIT or not torch.cuda.is_available():
+            return None
+        if importlib.util.find_spec("bitsandbytes") is None:
+            logger.warning("bitsandbytes not installed, skipping INT8 quantization")
+            return None
+        return BitsAndBytesConfig(
+            load_in_8bit=True, llm_int8_threshold=RECIPE_BOT_INT8_THRESHOLD
+        )
+
     def _load_base_model(self):
-        self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            self.base_model_name, use_fast=True
+        )
         self.tokenizer.pad_token = self.tokenizer.eos_token
 
         self.model = AutoModelForCausalLM.from_pretrained(
             self.base_model_name,
-            torch_dtype=torch.float32,
+            torch_dtype=self.dtype,
             device_map=self.device,
             low_cpu_mem_usage=True,
         )
         self.model.eval()
         logger.info("Base model loaded")
 
+    def _build_inputs(self, ingredients_text: str) -> dict[str, torch.Tensor]:
+        # Tokenize the whole prompt in one call: the SentencePiece normalizer
+        # prepends "▁" per call, so concatenating pieces would shift the ids
+        return self.tokenizer(
+            f"{_PROMPT_PREFIX}{ingredients_text}{_PROMPT_SUFFIX}",
+            return_tensors="pt",
+            padding=False,
+            truncation=True,
+            max_length=_PROMPT_MAX_LENGTH,
+        ).to(self.model.device)
+
+    def _optimize_model(self):
+        # The INT8 path keeps the PEFT wrapper on CUDA; fused CPU kernels don't apply
+        if isinstance(self.model, PeftModel):
+            return
+
+        try:
+            import intel_extension_for_pytorch as ipex
+
+            self.model = ipex.llm.optimize(self.model, dtype=self.dtype)
+            logger.info("Applied ipex.llm.optimize")
+        except ImportError:
+            logger.info("intel_extension_for_pytorch not installed, skipping ipex")
+
+        if not RECIPE_BOT_TORCH_COMPILE:
+            return
+
+        self._eager_forward = self.model.forward
+        self.model.forward = torch.compile(
+            self.model.forward, mode=RECIPE_BOT_COMPILE_MODE, fullgraph=False
+        )
+        logger.info(f"Compiled model forward (mode: {RECIPE_BOT_COMPILE_MODE})")
+
+    @torch.inference_mode()
+    def _generate(self, inputs: dict[str, torch.Tensor], **generate_kwargs):
+        with (
+            self._generate_lock,
+            torch.autocast(
+                "cpu", dtype=torch.bfloat16, enabled=self.dtype == torch.bfloat16
+            ),
+        ):
+            return self.model.generate(
+                **inputs,
+                pad_token_id=self.tokenizer.eos_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                **generate_kwargs,
+            )
+
+    def warmup(self):
+        # First generate pays kernel selection and torch.compile tracing
+        logger.info("Warming up recipe model...")
+        inputs = self._build_inputs("salt")
+
+        try:
+            self._generate(
+                inputs,
+                **_sampling_kwargs(deterministic=True),
+                max_new_tokens=RECIPE_BOT_WARMUP_TOKENS,
+            )
+        except Exception as e:
+            logger.error(f"Warmup failed, falling back to eager forward: {e}")
+            if hasattr(self, "_eager_forward"):
+                self.model.forward = self._eager_forward
+
     def generate_recipe(
-        self, ingredients: str, use_fallback: bool = True
+        self, ingredients: str, use_fallback: bool = True, deterministic: bool = False
     ) -> dict[str, str]:
         try:
             ingredient_list = [ing.strip() for ing in ingredients.split(",")]
             ingredients_text = ", ".join(ingredient_list)
 
-            prompt = f"""<s>[INST] Suggest a recipe using the following ingredients:
-{ingredients_text} [/INST]"""
+            # Greedy decoding is reproducible, so repeat requests can hit the cache
+            cache_key = ingredients_text.lower()
+            if deterministic and cache_key in self._recipe_cache:
+                logger.info(f" Serving cached recipe for: {ingredients_text}")
+                return dict(self._recipe_cache[cache_key])
 
             logger.info(f" Generating recipe for: {ingredients_text}")
 
-            inputs = self.tokenizer(
-                prompt,
-                return_tensors="pt",
-                padding=False,
-                truncation=True,
-                max_length=512,
-            )
-
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=RECIPE_MAX_NEW_TOKENS,
-                    min_new_tokens=RECIPE_MIN_NEW_TOKENS,
-                    temperature=RECIPE_TEMPERATURE,
-                    do_sample=True,
-                    top_p=RECIPE_TOP_P,
-                    top_k=RECIPE_TOP_K,
-                    repetition_penalty=RECIPE_REPETITION_PENALTY,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,
-                )
+            inputs = self._build_inputs(ingredients_text)
 
-            full_response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            outputs = self._generate(
+                inputs,
+                **_sampling_kwargs(deterministic),
+                max_new_tokens=RECIPE_MAX_NEW_TOKENS,
+                min_new_tokens=RECIPE_MIN_NEW_TOKENS,
+                repetition_penalty=RECIPE_REPETITION_PENALTY,
+            )
 
-            if "[/INST]" in full_response:
-                recipe_text = full_response.split("[/INST]", 1)[1].strip()
-            else:
-                recipe_text = full_response.strip()
+            # Decode only the continuation; the prompt tokens are already known
+            new_tokens = outputs[0][inputs["input_ids"].shape[1] :]
+            recipe_text = self.tokenizer.decode(
+                new_tokens, skip_special_tokens=True
+            ).strip()
 
             if not self._is_valid_recipe(recipe_text):
                 logger.info(
@@ -130,12 +275,15 @@ class RecipeBot:
                         "error": "Generated invalid recipe",
                     }
 
-            return {
+            result = {
                 "success": True,
                 "ingredients": ingredients_text,
                 "recipe": recipe_text,
                 "error": None,
             }
+            if deterministic:
+                self._recipe_cache[cache_key] = result
+            return dict(result)
 
         except Exception as e:
             logger.error(f"Error during generation: {e}")
@@ -148,29 +296,64 @@ class RecipeBot:
                 "error": str(e),
             }
 
+    def stream_recipe(
+        self, ingredients: str, deterministic: bool = False
+    ) -> Iterator[str]:
+        ingredient_list = [ing.strip() for ing in ingredients.split(",")]
+        ingredients_text = ", ".join(ingredient_list)
+
+        logger.info(f" Streaming recipe for: {ingredients_text}")
+
+        inputs = self._build_inputs(ingredients_text)
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+
+        errors = []
+
+        def run():
+            try:
+                self._generate(
+                    inputs,
+                    **_sampling_kwargs(deterministic),
+                    max_new_tokens=RECIPE_MAX_NEW_TOKENS,
+                    min_new_tokens=RECIPE_MIN_NEW_TOKENS,
+                    repetition_penalty=RECIPE_REPETITION_PENALTY,
+                    streamer=streamer,
+                )
+            except Exception as e:
+                logger.error(f"Error during streamed generation: {e}")
+                errors.append(e)
+                # Unblock the consumer, generate() never reached its own end()
+                streamer.end()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        chunks = []
+        for chunk in streamer:
+            chunks.append(chunk)
+            yield chunk
+        thread.join()
+
+        # Surface a mid-stream failure instead of ending like a finished recipe
+        if errors:
+            raise RuntimeError(f"Recipe generation failed: {errors[0]}") from errors[0]
+
+        # Same gate as generate_recipe; the client only caches after a clean end
+        if not self._is_valid_recipe("".join(chunks).strip()):
+            logger.info("Streamed response doesn't look like a recipe")
+            raise ValueError("Generated invalid recipe")
+
     def _is_valid_recipe(self, text: str) -> bool:
         if len(text) < 100:
             return False
 
-        text_lower = text.lower()
-
-        has_ingredients = "ingredients:" in text_lower or "ingredient" in text_lower
-        has_instructions = "instructions:" in text_lower or "instruction" in text_lower
-
-        cooking_words = [
-            "cook",
-            "heat",
-            "add",
-            "mix",
-            "stir",
-            "serve",
-            "bake",
-            "fry",
-            "boil",
-        ]
-        has_cooking_actions = (
-            sum(1 for word in cooking_words if word in text_lower) >= 2
-        )
+        has_ingredients = _INGREDIENT_RE.search(text) is not None
+        has_instructions = _INSTRUCTION_RE.search(text) is not None
+
+        # Needs two distinct cooking verbs; substrings count ("cooked", "adding")
+        cooking_words = {word.lower() for word in _COOKING_WORD_RE.findall(text)}
+        has_cooking_actions = len(cooking_words) >= 2
 
         return (has_ingredients or has_instructions) and has_cooking_actions
 
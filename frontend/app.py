@@ -1,3 +1,7 @@
+import re
+from collections import OrderedDict
+
+import pandas as pd
 import requests
 import streamlit as st
 
@@ -6,10 +10,10 @@ st.set_page_config(
 )
 
 API_BASE_URL = "http://localhost:8000"
+RESPONSE_CACHE_SIZE = 32
+MAX_BATCH_NAMES = 64  # backend NAME_MATCHER_MAX_BATCH
 
-st.markdown(
-    """
-    <style>
+PAGE_CSS = """
     .main-header {
         font-size: 2.5rem;
         font-weight: bold;
@@ -31,7 +35,8 @@ st.markdown(
         margin-bottom: 1rem;
         border-left: 5px solid #1f77b4;
     }
-    .recipe-card {
+    /* st.container(key="recipe_card") renders with this class */
+    .st-key-recipe_card {
         background-color: #f5f5f5;
         color: #000000;
         padding: 1.5rem;
@@ -40,7 +45,6 @@ st.markdown(
         border-left: 5px solid #2ca02c;
         line-height: 1.6;
         font-size: 16px;
-        white-space: pre-wrap;
     }
     .best-match {
         background-color: #ffe4b5;
@@ -49,20 +53,116 @@ st.markdown(
         border: 2px solid #ffa500;
         margin-bottom: 1.5rem;
     }
-    </style>
-""",
-    unsafe_allow_html=True,
-)
+"""
+
+
+@st.cache_resource
+def get_css():
+    # Built once per server process; whitespace collapsed to keep the payload small
+    css = re.sub(r"\s+", " ", PAGE_CSS).strip()
+    return f"<style>{css}</style>"
+
+
+st.markdown(get_css(), unsafe_allow_html=True)
+
+
+@st.cache_resource
+def get_session():
+    # One keep-alive connection pool per server process, reused across reruns
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
+@st.cache_data(ttl=10, show_spinner=False)
 def check_api_health():
     try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=2)
+        response = get_session().get(f"{API_BASE_URL}/health", timeout=2)
         return response.status_code == 200
     except:
         return False
 
 
+def get_cached_response(cache_name, key):
+    # Per-user LRU in session_state: repeat searches skip the backend entirely
+    cache = st.session_state.get(cache_name)
+    if cache is None or key not in cache:
+        return None
+    cache.move_to_end(key)
+    return cache[key]
+
+
+def cache_response(cache_name, key, data):
+    if cache_name not in st.session_state:
+        st.session_state[cache_name] = OrderedDict()
+    cache = st.session_state[cache_name]
+    cache[key] = data
+    cache.move_to_end(key)
+    if len(cache) > RESPONSE_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def error_detail(response):
+    detail = response.json().get("detail", "Unknown error")
+    # FastAPI validation errors (422) arrive as a list of {loc, msg, ...} dicts
+    if isinstance(detail, list):
+        return "; ".join(error.get("msg", str(error)) for error in detail)
+    return detail
+
+
+def fetch_all_matches(names):
+    # Each request carries a whole chunk of names, scored as one batch on the backend
+    results = []
+    for start in range(0, len(names), MAX_BATCH_NAMES):
+        response = get_session().post(
+            f"{API_BASE_URL}/api/match-names-batch",
+            json={"names": names[start : start + MAX_BATCH_NAMES]},
+            timeout=10,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(error_detail(response))
+        results.extend(response.json()["results"])
+    return results
+
+
+def display_name_matches(name_input, data):
+    st.markdown("### Best Match")
+    best_match = data["best_match"]
+    st.markdown(
+        f"""
+    <div class="best-match">
+        <h2 style="margin: 0; color: #ff6347;">{best_match["name"]}</h2>
+        <p style="font-size: 1.2rem; margin: 0.5rem 0 0 0;">
+            Similarity Score: <strong>{best_match["score"]:.1%}</strong>
+        </p>
+    </div>
+    """,
+        unsafe_allow_html=True,
+    )
+
+    st.markdown("### All Matches (Ranked)")
+
+    # One dataframe instead of a row of widgets per match
+    matches = pd.DataFrame(data["all_matches"], columns=["name", "score"])
+    matches["score"] *= 100
+    matches.insert(0, "#", range(1, len(matches) + 1))
+    st.dataframe(
+        matches,
+        column_config={
+            "name": st.column_config.TextColumn("Name"),
+            "score": st.column_config.ProgressColumn(
+                "Score", format="%.1f%%", min_value=0, max_value=100
+            ),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
+    st.success(f"Found {len(data['all_matches'])} matching names for '{name_input}'")
+
+
 def display_task1():
     st.markdown(
         '<div class="task-header">Task 1: Name Matching System</div>',
@@ -76,7 +176,7 @@ def display_task1():
 
     with col1:
         name_input = st.text_input(
-            "Enter a name to find matches:",
+            "Enter a name to find matches (comma-separate several):",
             placeholder="e.g., Gita, Mohammad, Priya, Kris",
             key="name_input",
         )
@@ -89,68 +189,125 @@ def display_task1():
     st.info(" **Try these examples:** Gita, Mohammad, Prya, Kris, Sandeep, Lakshmi")
 
     if search_button and name_input:
-        with st.spinner("Searching for similar names..."):
-            try:
-                response = requests.post(
-                    f"{API_BASE_URL}/api/match-names",
-                    json={"name": name_input},
-                    timeout=10,
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-
-                    st.markdown("### Best Match")
-                    best_match = data["best_match"]
-                    st.markdown(
-                        f"""
-                    <div class="best-match">
-                        <h2 style="margin: 0; color: #ff6347;">{best_match["name"]}</h2>
-                        <p style="font-size: 1.2rem; margin: 0.5rem 0 0 0;">
-                            Similarity Score: <strong>{best_match["score"]:.1%}</strong>
-                        </p>
-                    </div>
-                    """,
-                        unsafe_allow_html=True,
-                    )
-
-                    st.markdown("### All Matches (Ranked)")
-
-                    for i, match in enumerate(data["all_matches"], 1):
-                        col1, col2, col3 = st.columns([1, 3, 2])
-
-                        with col1:
-                            st.markdown(f"**#{i}**")
-
-                        with col2:
-                            st.markdown(f"**{match['name']}**")
-
-                        with col3:
-                            score_pct = match["score"]
-                            st.progress(score_pct)
-                            st.caption(f"Score: {score_pct:.1%}")
-
-                        if i < len(data["all_matches"]):
-                            st.divider()
-
-                    st.success(
-                        f"Found {len(data['all_matches'])} matching names for '{name_input}'"
-                    )
-
-                else:
-                    st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
+        names = [name.strip() for name in name_input.split(",") if name.strip()]
 
+        cached = {name: get_cached_response("match_cache", name) for name in names}
+        missing = list(dict.fromkeys(name for name in names if cached[name] is None))
+        if missing:
+            try:
+                with st.spinner("Searching for similar names..."):
+                    results = fetch_all_matches(missing)
             except requests.exceptions.ConnectionError:
                 st.error(
                     "Cannot connect to API. Please ensure the backend server is running."
                 )
+                return
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
+                return
+
+            for name, data in zip(missing, results, strict=True):
+                cache_response("match_cache", name, data)
+                cached[name] = data
+
+        for name in names:
+            if len(names) > 1:
+                st.markdown(f"## Results for '{name}'")
+            display_name_matches(name, cached[name])
 
     elif search_button:
         st.warning("Please enter a name to search.")
 
 
+def recipe_markdown(recipe):
+    # The model writes one step per line; a trailing double space keeps each break
+    return recipe.replace("\n", "  \n")
+
+
+def display_recipe_header(generated_by):
+    st.markdown("### Recipe Suggestion")
+
+    if generated_by == "recipe-lora":
+        st.success("Generated using custom lora")
+    else:
+        st.info("Retrieved from Recipe Database")
+
+
+def display_cooking_tips():
+    with st.expander("Cooking Tips"):
+        st.write("""
+        - Always prep ingredients before cooking
+        - Adjust spices according to your taste
+        - You can substitute ingredients based on availability
+        - Follow food safety guidelines
+        """)
+
+
+def display_recipe(data):
+    display_recipe_header(data["generated_by"])
+    with st.container(border=True, key="recipe_card"):
+        st.markdown(recipe_markdown(data["recipe"]))
+    display_cooking_tips()
+
+
+def iter_sse_events(response):
+    event, fields = "message", []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            value = line[len("data:") :]
+            # Only the single separator space is framing; tokens keep their own
+            fields.append(value[1:] if value.startswith(" ") else value)
+        elif not line and fields:
+            yield event, "\n".join(fields)
+            event, fields = "message", []
+
+
+def stream_recipe(ingredients_input):
+    with get_session().post(
+        f"{API_BASE_URL}/api/stream-recipe",
+        json={"ingredients": ingredients_input},
+        stream=True,
+        timeout=300,
+    ) as response:
+        if response.status_code != 200:
+            st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
+            return
+
+        response.encoding = "utf-8"
+        display_recipe_header("recipe-lora")
+        with st.container(border=True, key="recipe_card"):
+            placeholder = st.empty()
+        recipe = ""
+        completed = False
+        for event, data in iter_sse_events(response):
+            if event == "error":
+                st.error(f"Error: {data}")
+                return
+            if event == "done":
+                completed = True
+                break
+            recipe += data
+            placeholder.markdown(recipe_markdown(recipe))
+
+    # Only a stream that reached its done event is a whole recipe worth caching
+    if not completed:
+        st.warning("The recipe stream ended early. Please try again.")
+        return
+
+    if not recipe.strip():
+        st.warning("The model returned an empty recipe. Please try again.")
+        return
+
+    cache_response(
+        "recipe_cache",
+        ingredients_input,
+        {"recipe": recipe, "generated_by": "recipe-lora"},
+    )
+    display_cooking_tips()
+
+
 def display_task2():
     st.markdown(
         '<div class="task-header">Task 2: Recipe Chatbot</div>',
@@ -179,56 +336,24 @@ def display_task2():
     )
 
     if recipe_button and ingredients_input:
-        with st.spinner("Cooking up recipe suggestions..."):
-            try:
-                response = requests.post(
-                    f"{API_BASE_URL}/api/get-recipe",
-                    json={"ingredients": ingredients_input},
-                    timeout=300,
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-
-                    st.markdown("### Recipe Suggestion")
-
-                    if data["generated_by"] == "recipe-lora":
-                        st.success("Generated using custom lora")
-                    else:
-                        st.info("Retrieved from Recipe Database")
-
-                    recipe_html = data["recipe"].replace("\n", "<br>")
-
-                    st.markdown(
-                        f"""
-                    <div class="recipe-card">
-                        {recipe_html}
-                    </div>
-                    """,
-                        unsafe_allow_html=True,
-                    )
-
-                    with st.expander("Cooking Tips"):
-                        st.write("""
-                        - Always prep ingredients before cooking
-                        - Adjust spices according to your taste
-                        - You can substitute ingredients based on availability
-                        - Follow food safety guidelines
-                        """)
-
-                else:
-                    st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
-
-            except requests.exceptions.ConnectionError:
-                st.error(
-                    "Cannot connect to API. Please ensure the backend server is running."
-                )
-            except requests.exceptions.Timeout:
-                st.error(
-                    "Request timeout. The LLM might be taking too long. Please try again."
-                )
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
+        cached = get_cached_response("recipe_cache", ingredients_input)
+        if cached is not None:
+            display_recipe(cached)
+            return
+
+        try:
+            stream_recipe(ingredients_input)
+
+        except requests.exceptions.ConnectionError:
+            st.error(
+                "Cannot connect to API. Please ensure the backend server is running."
+            )
+        except requests.exceptions.Timeout:
+            st.error(
+                "Request timeout. The LLM might be taking too long. Please try again."
+            )
+        except Exception as e:
+            st.error(f"An error occurred: {str(e)}")
 
     elif recipe_button:
         st.warning("Please enter some ingredients.")
@@ -240,6 +365,10 @@ def main():
         unsafe_allow_html=True,
     )
 
+    # Health is cached for a few seconds; let the user force a fresh probe
+    if st.sidebar.button("Refresh status", use_container_width=True):
+        check_api_health.clear()
+
     api_status = check_api_health()
 
     if api_status:
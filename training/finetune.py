@@ -1,14 +1,20 @@
-import json
 import logging
 import os
+from itertools import chain
+from pathlib import Path
 
+import orjson
 import torch
 from datasets import Dataset
+from datasets.fingerprint import Hasher
+from helpers.inference_utils import compile_for_generation, optimize_for_cpu
+from packaging.version import Version
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
-    DataCollatorForLanguageModeling,
+    BitsAndBytesConfig,
+    DataCollatorForSeq2Seq,
     Trainer,
     TrainingArguments,
 )
@@ -20,15 +26,24 @@ logger = logging.getLogger(__name__)
 MODEL_NAME = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
 OUTPUT_DIR = "./recipe-bot-finetuned"
 DATASET_FILE = "recipes_training.json"
+CACHE_DIR = Path("./cache")
+BLOCK_SIZE = 512
 
 
 def load_and_prepare_data(file_path):
-    with open(file_path) as f:
-        data = json.load(f)
+    with open(file_path, "rb") as f:
+        data = orjson.loads(f.read())
 
     return Dataset.from_dict({"text": [item["text"] for item in data]})
 
 
+def tokenized_cache_path(file_path):
+    # A changed dataset, tokenizer, block size or preprocessing code gets a fresh entry
+    mtime = Path(file_path).stat().st_mtime
+    key = Hasher.hash((mtime, MODEL_NAME, BLOCK_SIZE, tokenize_function, group_texts))
+    return CACHE_DIR / f"recipes_tok_{key}"
+
+
 def create_qlora_config():
     return LoraConfig(
         r=8,
@@ -40,52 +55,141 @@ def create_qlora_config():
     )
 
 
-def tokenize_function(examples, tokenizer, max_length=512):
-    return tokenizer(
-        examples["text"],
-        truncation=True,
-        max_length=max_length,
-        padding="max_length",
-        return_tensors="pt",
+def create_bnb_config(compute_dtype):
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=compute_dtype,
+        bnb_4bit_use_double_quant=True,
     )
 
 
+def select_compute_dtype(use_cuda):
+    if use_cuda:
+        # pre-Ampere GPUs have no bf16
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    # Without native BF16 (AVX512-BF16/AMX) the CPU emulates it, slower than FP32
+    if (
+        torch.backends.mkldnn.is_available()
+        and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    ):
+        return torch.bfloat16
+    return torch.float32
+
+
+def select_optimizer(use_cuda):
+    # 8-bit Adam states need bitsandbytes on CUDA; fused CPU AdamW landed in torch 2.4
+    if use_cuda:
+        return "paged_adamw_8bit"
+    if Version(torch.__version__).release >= (2, 4):
+        return "adamw_torch_fused"
+    return "adamw_torch"
+
+
+def tokenize_function(examples, tokenizer):
+    # EOS marks the boundary between examples once they are packed together;
+    # texts that already end in a literal </s> must not get a second one
+    eos = tokenizer.eos_token_id
+    input_ids = tokenizer(examples["text"])["input_ids"]
+    return {"input_ids": [ids if ids[-1] == eos else ids + [eos] for ids in input_ids]}
+
+
+def group_texts(examples, block_size=BLOCK_SIZE):
+    # Pack examples back to back into full blocks so (almost) no position is padding
+    concatenated = list(chain.from_iterable(examples["input_ids"]))
+    blocks = [
+        concatenated[i : i + block_size]
+        for i in range(0, len(concatenated), block_size)
+    ]
+    return {
+        "input_ids": blocks,
+        "attention_mask": [[1] * len(block) for block in blocks],
+        "labels": [list(block) for block in blocks],
+    }
+
+
 def main():
     logger.info("Recipe Bot QLoRA Fine-tuning")
 
+    # Leave one core for the data pipeline and the OS
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) - 1))
+    torch.set_num_interop_threads(2)
+
     logger.info(f"\n1. Loading tokenizer from {MODEL_NAME}...")
     tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
     tokenizer.pad_token = tokenizer.eos_token
     tokenizer.padding_side = "right"
 
+    use_cuda = torch.cuda.is_available()
+    compute_dtype = select_compute_dtype(use_cuda)
+    logger.info(f"Compute dtype: {compute_dtype}")
+
     logger.info(f"\n2. Loading model from {MODEL_NAME}...")
-    model = AutoModelForCausalLM.from_pretrained(
-        MODEL_NAME, torch_dtype=torch.float32, device_map="cpu", low_cpu_mem_usage=True
-    )
+    if use_cuda:
+        # Real QLoRA: NF4 base weights, LoRA adapters trained in compute_dtype
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL_NAME,
+            quantization_config=create_bnb_config(compute_dtype),
+            device_map="auto",
+            low_cpu_mem_usage=True,
+            attn_implementation="sdpa",
+        )
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL_NAME,
+            torch_dtype=compute_dtype,
+            device_map="cpu",
+            low_cpu_mem_usage=True,
+            attn_implementation="sdpa",
+        )
 
     logger.info("\n3. Preparing model for QLoRA training...")
-    model.gradient_checkpointing_enable()
-    model = prepare_model_for_kbit_training(model)
+    # Recomputing activations only pays off when they would not fit in VRAM;
+    # with LoRA at batch size 1 on CPU it just doubles the forward cost
+    use_checkpointing = False
+    if use_cuda:
+        free_vram, _ = torch.cuda.mem_get_info()
+        use_checkpointing = model.num_parameters() * 4 > free_vram
+        model = prepare_model_for_kbit_training(
+            model, use_gradient_checkpointing=use_checkpointing
+        )
+    logger.info(f"Gradient checkpointing: {use_checkpointing}")
+    if use_checkpointing:
+        model.config.use_cache = False
 
     logger.info("\n4. Applying LoRA configuration...")
     lora_config = create_qlora_config()
     model = get_peft_model(model, lora_config)
 
-    trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
-    total_params = sum(p.numel() for p in model.parameters())
+    trainable_params = total_params = 0
+    for param in model.parameters():
+        numel = param.numel()
+        total_params += numel
+        if param.requires_grad:
+            trainable_params += numel
     logger.info(f"\nTrainable parameters: {trainable_params:,}")
     logger.info(f"Total parameters: {total_params:,}")
     logger.info(f"Trainable %: {100 * trainable_params / total_params:.2f}%")
 
-    logger.info(f"\n5. Loading dataset from {DATASET_FILE}...")
-    dataset = load_and_prepare_data(DATASET_FILE)
-    logger.info(f"Loaded {len(dataset)} training examples")
-
-    logger.info("\n6. Tokenizing dataset...")
-    tokenized_dataset = dataset.map(
-        lambda x: tokenize_function(x, tokenizer),
-        batched=True,
-        remove_columns=dataset.column_names,
+    cache_path = tokenized_cache_path(DATASET_FILE)
+    if cache_path.is_dir():
+        logger.info(f"\n5-6. Loading tokenized dataset from {cache_path}...")
+        tokenized_dataset = Dataset.load_from_disk(cache_path)
+    else:
+        logger.info(f"\n5. Loading dataset from {DATASET_FILE}...")
+        dataset = load_and_prepare_data(DATASET_FILE)
+        logger.info(f"Loaded {len(dataset)} training examples")
+
+        logger.info("\n6. Tokenizing dataset...")
+        tokenized_dataset = dataset.map(
+            lambda x: tokenize_function(x, tokenizer),
+            batched=True,
+            remove_columns=dataset.column_names,
+        )
+        tokenized_dataset = tokenized_dataset.map(group_texts, batched=True)
+        tokenized_dataset.save_to_disk(cache_path)
+    logger.info(
+        f"Packed into {len(tokenized_dataset)} blocks of up to {BLOCK_SIZE} tokens"
     )
 
     logger.info("\n7. Setting up training arguments...")
@@ -95,19 +199,23 @@ def main():
         per_device_train_batch_size=1,
         gradient_accumulation_steps=4,
         learning_rate=2e-4,
-        fp16=False,
+        bf16=compute_dtype == torch.bfloat16,
+        fp16=compute_dtype == torch.float16,
         save_steps=50,
         logging_steps=10,
         save_total_limit=2,
-        remove_unused_columns=False,
         push_to_hub=False,
         report_to="none",
         load_best_model_at_end=False,
-        warmup_steps=10,
-        optim="adamw_torch",
+        lr_scheduler_type="cosine",
+        warmup_ratio=0.03,
+        optim=select_optimizer(use_cuda),
+        dataloader_num_workers=min(4, (os.cpu_count() or 1) // 2),
+        dataloader_pin_memory=use_cuda,
     )
 
-    data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    # Labels are set during packing; only a trailing short block ever needs padding
+    data_collator = DataCollatorForSeq2Seq(tokenizer=tokenizer, label_pad_token_id=-100)
 
     logger.info("\n8. Initializing trainer...")
     trainer = Trainer(
@@ -134,6 +242,9 @@ def main():
 
 def test_inference(model, tokenizer):
     model.eval()
+    model.config.use_cache = True
+    model = optimize_for_cpu(model)
+    compile_for_generation(model)
 
     test_prompts = [
         "<s>[INST] Suggest a recipe using eggs and onions\nIngredients: eggs, onions [/INST]",
@@ -142,17 +253,26 @@ def test_inference(model, tokenizer):
 
     logger.info("\nTest Results:")
 
-    for prompt in test_prompts:
-        inputs = tokenizer(prompt, return_tensors="pt")
-
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs, max_new_tokens=200, temperature=0.7, do_sample=True, top_p=0.9
-            )
-
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    # One padded batch: each decoding step serves every prompt at once
+    tokenizer.padding_side = "left"
+    inputs = tokenizer(test_prompts, return_tensors="pt", padding=True).to(model.device)
+
+    with torch.inference_mode():
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=200,
+            temperature=0.7,
+            do_sample=True,
+            top_p=0.9,
+            pad_token_id=tokenizer.pad_token_id,
+            cache_implementation="static",
+        )
+
+    prompt_length = inputs["input_ids"].shape[1]
+    for prompt, output in zip(test_prompts, outputs, strict=True):
+        response = tokenizer.decode(output[prompt_length:], skip_special_tokens=True)
         logger.info(f"\nPrompt: {prompt[:50]}...")
-        logger.info(f"Response: {response[len(prompt) :]}")
+        logger.info(f"Response: {response}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+import logging
+import sys
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+MODEL_NAME = "sentence-transformers/paraphrase-MiniLM-L3-v2"
+OUTPUT_DIR = Path(__file__).resolve().parents[2] / "models" / "minilm-int8"
+QUANTIZED_FILE = "model_int8.onnx"
+
+
+def export_onnx(output_dir):
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    logger.info(f"1. Exporting {MODEL_NAME} to ONNX...")
+    model = ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True)
+    model.save_pretrained(output_dir)
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    tokenizer.save_pretrained(output_dir)
+    logger.info(f"   Exported to {output_dir}")
+
+
+def quantize(output_dir):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info("2. Quantizing weights to INT8...")
+    source = output_dir / "model.onnx"
+    target = output_dir / QUANTIZED_FILE
+    quantize_dynamic(str(source), str(target), weight_type=QuantType.QInt8)
+
+    source_mb = source.stat().st_size / (1024 * 1024)
+    target_mb = target.stat().st_size / (1024 * 1024)
+    logger.info(
+        f"   {source.name}: {source_mb:.2f} MB -> {target.name}: {target_mb:.2f} MB"
+    )
+
+
+def main():
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum  # noqa: F401
+    except ImportError:
+        logger.info("optimum / onnxruntime not installed!")
+        logger.info("Run: pip install optimum[onnxruntime]")
+        sys.exit(1)
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    export_onnx(OUTPUT_DIR)
+    quantize(OUTPUT_DIR)
+    logger.info("Name matcher will load the INT8 encoder on next startup.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def optimize_for_cpu(model):
+    # ipex.optimize without an optimizer is inference-only, so training skips it
+    if next(model.parameters()).is_cuda:
+        return model
+
+    try:
+        import intel_extension_for_pytorch as ipex
+    except ImportError:
+        logger.info("intel_extension_for_pytorch not installed, skipping ipex")
+        return model
+
+    dtype = next(model.parameters()).dtype
+    model = ipex.optimize(
+        model, dtype=dtype if dtype == torch.bfloat16 else None, inplace=True
+    )
+    logger.info("Applied ipex.optimize")
+    return model
+
+
+def compile_for_generation(model):
+    # generate() calls the wrapped causal LM's forward, even through a PeftModel
+    target = model.get_base_model() if hasattr(model, "get_base_model") else model
+    target.forward = torch.compile(
+        target.forward, mode="reduce-overhead", fullgraph=False
+    )